@@ -1,12 +1,11 @@
 """This module provides image (2D array) utility functions."""
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
-from functools import reduce
-from copy import deepcopy
 from PIL import Image
 import numpy as np
 from astropy import log
 from astropy.convolution import convolve
+from scipy import ndimage, signal
 
 
 def remove_nonfinite(data):
@@ -32,11 +31,17 @@ def remove_nonfinite(data):
     if np.any(mask):
         # use astropy's convolve as a 5x5 mean filter that ignores nans
         # (in regions that are smaller than 5x5)
-        data_out = deepcopy(np.asanyarray(data))
+        data_out = np.asanyarray(data).copy()
         data_out[mask] = np.nan
         filt = np.ones((5, 5))
-        data_conv = convolve(data_out, filt) / filt.sum()
-        data_out[mask] = data_conv[mask]
+        # the filtered values are needed only for the non-finite pixels,
+        # so convolve just their bounding box padded by the filter
+        # half-width
+        slc = tuple(slice(max(s.start - 2, 0), s.stop + 2)
+                    for s in bbox_threshold(mask))
+        data_conv = convolve(data_out[slc], filt) / filt.sum()
+        mask_slc = mask[slc]
+        data_out[slc][mask_slc] = data_conv[mask_slc]
 
         # if there any non-finite values left (e.g. contiguous non-finite
         # regions larger than the filter size), then simply set them to zero.
@@ -79,8 +84,7 @@ def resize_image(data, scale_factor):
 
     y_size = int(round(ny * scale_factor))
     x_size = int(round(nx * scale_factor))
-    data = np.array(Image.fromarray(data.astype(float)).resize(
-        (x_size, y_size)), dtype=data.dtype)
+    data = _resize(data, x_size, y_size)
     # from scipy.misc import imresize
     # data = imresize(data, (y_size, x_size)).astype(data.dtype)
 
@@ -113,8 +117,7 @@ def resize_image_absolute(data, x_size, y_size):
 
     data = np.asanyarray(data)
     ny, nx = data.shape
-    data = np.array(Image.fromarray(data.astype(float)).resize(
-        (x_size, y_size)), dtype=data.dtype)
+    data = _resize(data, x_size, y_size)
 
     log.info('The array was resized from {0}x{1} to {2}x{3} '
              '(ny x nx).'.format(ny, nx, y_size, x_size))
@@ -122,7 +125,60 @@ def resize_image_absolute(data, x_size, y_size):
     return data
 
 
-def normalize_data(data, max_value=1.):
+def _resize(data, x_size, y_size):
+    """
+    Resize a 2D array to ``(y_size, x_size)`` with PIL, returning an
+    array of the input dtype.
+    """
+
+    # PIL resizes floating-point images in single precision ('F' mode),
+    # so convert directly to float32 instead of via float64
+    image = Image.fromarray(data.astype(np.float32, copy=False))
+    image = image.resize((x_size, y_size))
+
+    # PIL exposes the resized buffer as a (read-only) float32 array, so
+    # a single conversion makes the writeable output array
+    return np.asarray(image).astype(data.dtype)
+
+
+def median_filter(data, size):
+    """
+    Filter a 2D array with a median filter.
+
+    Edges are handled by reflecting the array (the default mode of
+    `scipy.ndimage.median_filter`).  For odd filter sizes on float
+    arrays the specialized 2D `scipy.signal.medfilt2d` is used on the
+    padded array, which gives identical results but is faster.
+
+    Parameters
+    ----------
+    data : array-like
+        The input 2D data array.
+
+    size : int or tuple of int
+        The shape of filter window.  If ``size`` is an `int`, then
+        ``size`` will be used for both dimensions.
+
+    Returns
+    -------
+    result : `~numpy.ndarray`
+        The filtered array.
+    """
+
+    data = np.asarray(data)
+    size = np.broadcast_to(size, 2)
+    if (data.ndim != 2 or np.any(size % 2 == 0) or
+            data.dtype not in (np.float32, np.float64)):
+        return ndimage.median_filter(data, size=tuple(size))
+
+    pad = size // 2
+    padded = np.pad(data, tuple(zip(pad, pad)), mode='symmetric')
+    result = signal.medfilt2d(padded, kernel_size=tuple(size))
+    return result[pad[0]:pad[0] + data.shape[0],
+                  pad[1]:pad[1] + data.shape[1]]
+
+
+def normalize_data(data, max_value=1., out=None):
     """
     Normalize an array such that its values range from 0 to
     ``max_value``.
@@ -135,6 +191,10 @@ def normalize_data(data, max_value=1.):
     max_value : float, optional
         The maximum value of the normalized array.
 
+    out : `~numpy.ndarray`, optional
+        A floating-point array in which to place the result.  It may be
+        ``data`` itself to normalize the array in place.
+
     Returns
     -------
     result : `~numpy.ndarray`
@@ -143,10 +203,23 @@ def normalize_data(data, max_value=1.):
 
     data = np.asanyarray(data)
     minval, maxval = np.min(data), np.max(data)
+
+    # compute the result in a single output array instead of one
+    # temporary array per operation
+    if out is not None:
+        dtype = out.dtype
+    else:
+        dtype = data.dtype
+        if not np.issubdtype(dtype, np.inexact):
+            dtype = np.float64
+
     if (maxval - minval) == 0:
-        return (data / maxval) * max_value
+        result = np.divide(data, maxval, out=out, dtype=dtype)
     else:
-        return (data - minval) / (maxval - minval) * max_value
+        result = np.subtract(data, minval, out=out, dtype=dtype)
+        result /= (maxval - minval)
+    result *= max_value
+    return result
 
 
 def bbox_threshold(data, threshold=0):
@@ -179,12 +252,54 @@ def bbox_threshold(data, threshold=0):
     >>> data_cropped = data[slc]
     """
 
-    idx = np.where(data > threshold)
-    y0, y1 = min(idx[0]), max(idx[0]) + 1
-    x0, x1 = min(idx[1]), max(idx[1]) + 1
+    # reduce the boolean mask along each axis instead of building the
+    # (potentially huge) index arrays of every pixel above threshold
+    mask = np.asanyarray(data) > threshold
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    y0, y1 = rows[0], rows[-1] + 1
+    x0, x1 = cols[0], cols[-1] + 1
     return (slice(y0, y1), slice(x0, x1))
 
 
+def crop_pad(data, slc, pad_width=0):
+    """
+    Crop an array and pad it with zeros.
+
+    The cropped region is copied directly into a zero-filled output
+    array, instead of cropping and then padding (via `numpy.pad`) the
+    array.
+
+    Parameters
+    ----------
+    data : array-like
+        The input 2D data array.
+
+    slc : tuple of slice objects
+        The slice tuple used to crop the array (e.g. from
+        `bbox_threshold`).
+
+    pad_width : int, optional
+        The number of pixels used to pad each edge of the cropped
+        array.
+
+    Returns
+    -------
+    result : `~numpy.ndarray`
+        The cropped and padded array.  If ``pad_width`` is 0, then this
+        is a view of the cropped region of ``data``.
+    """
+
+    cropped = np.asanyarray(data)[slc]
+    if pad_width == 0:
+        return cropped
+
+    shape = tuple(size + 2 * pad_width for size in cropped.shape)
+    result = np.zeros(shape, dtype=cropped.dtype)
+    result[pad_width:-pad_width, pad_width:-pad_width] = cropped
+    return result
+
+
 def combine_masks(masks):
     """
     Combine boolean masks into a single mask.
@@ -208,7 +323,11 @@ def combine_masks(masks):
     elif nmasks == 1:
         return masks[0]
     else:
-        return reduce(lambda mask1, mask2: np.logical_or(mask1, mask2), masks)
+        # accumulate into a single output array
+        mask = np.logical_or(masks[0], masks[1])
+        for mask2 in masks[2:]:
+            np.logical_or(mask, mask2, out=mask)
+        return mask
 
 
 def combine_region_masks(region_masks):
@@ -233,12 +352,14 @@ def combine_region_masks(region_masks):
     nmasks = len(region_masks)
     if nmasks == 0:
         return region_masks
+    elif nmasks == 1:
+        return region_masks[0].mask
     else:
-        return reduce(
-            lambda mask, regm2: np.logical_or(mask, regm2.mask),
-            region_masks[1:],
-            region_masks[0].mask
-        )
+        # accumulate into a single output array
+        mask = np.logical_or(region_masks[0].mask, region_masks[1].mask)
+        for regm2 in region_masks[2:]:
+            np.logical_or(mask, regm2.mask, out=mask)
+        return mask
 
 
 def radial_distance(shape, position):
@@ -261,10 +382,11 @@ def radial_distance(shape, position):
         map.
     """
 
-    x = np.arange(shape[1]) - position[1]
-    y = np.arange(shape[0]) - position[0]
-    xx, yy = np.meshgrid(x, y)
-    return np.sqrt(xx**2 + yy**2)
+    # square the 1D offsets and broadcast them, instead of building and
+    # squaring full 2D coordinate grids
+    x2 = (np.arange(shape[1]) - position[1]) ** 2
+    y2 = (np.arange(shape[0]) - position[0]) ** 2
+    return np.sqrt(x2[np.newaxis, :] + y2[:, np.newaxis])
 
 
 def radial_weight_map(shape, position, alpha=0.8):
@@ -290,9 +412,10 @@ def radial_weight_map(shape, position, alpha=0.8):
         map.
     """
 
+    # raise the distances to the power in place; the distance map itself
+    # is not needed
     r = radial_distance(shape, position)
-    r2 = r ** alpha
-    return r2
+    return np.power(r, alpha, out=r)
 
 
 def legacy_radial_weight_map(shape, position, alpha=0.8, r_min=100, r_max=450,
@@ -329,9 +452,9 @@ def legacy_radial_weight_map(shape, position, alpha=0.8, r_min=100, r_max=450,
     """
 
     r = radial_distance(shape, position)
-    r2 = r ** alpha
     min_mask = (r < r_min)
     max_mask = (r > r_max)
+    r2 = np.power(r, alpha, out=r)
     r2[min_mask] = r2[min_mask].min()
     r2[max_mask] = r2[max_mask].max()
     r2 /= r2.max()
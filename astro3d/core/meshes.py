@@ -4,7 +4,6 @@ This module provides functions to convert an image array to STL files.
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 import os
-from copy import deepcopy
 import numpy as np
 from astropy import log
 
@@ -348,7 +347,7 @@ def write_mesh(image, filename_prefix, mm_per_pixel=0.242, double_sided=False,
     """
 
     if isinstance(image, np.ma.core.MaskedArray):
-        image = deepcopy(image.data)
+        image = image.data.copy()
 
     triangles = make_triangles(image, mm_per_pixel=mm_per_pixel)
 
@@ -5,17 +5,19 @@ This module provides tools to create a 3D model from an astronomical image.
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 from collections import defaultdict
-from copy import deepcopy, copy
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy
+from functools import partial
 import glob
 import warnings
 from distutils.version import LooseVersion
 
 from astropy import log
 from astropy.io import fits
+from astropy.stats import sigma_clipped_stats
 from astropy.table import Table
 from astropy.utils.exceptions import AstropyUserWarning
 import numpy as np
-import numpy.ma as ma
 import photutils
 from PIL import Image
 from scipy import ndimage
@@ -55,6 +57,13 @@ class Model3D(object):
     mm_per_pixel : float, optional
         The physical scale of the model.
 
+    dtype : data-type, optional
+        The floating-point data type of the working image arrays used
+        when making the model (e.g. ``np.float32`` to halve the memory
+        footprint).  If `None`, then the data type of the input
+        ``data`` is used, unless it is not floating point, in which
+        case ``np.float64`` is used.
+
     Examples
     --------
     >>> # initialize the model
@@ -97,14 +106,19 @@ class Model3D(object):
                  small_dots_spacing=7.0, dots_diameter=9.0,
                  dots_height=4.0, dots_spacing=11.0,
                  lines_thickness=13.0, lines_height=7.8,
-                 lines_spacing=20.0):
+                 lines_spacing=20.0, dtype=None):
         self.data_original = np.asanyarray(data)
         self.image_size = image_size
         self.mm_per_pixel = mm_per_pixel
+        self.dtype = dtype
         self._resize_scale_factor = self._calc_scale_factor(
             self.data_original.shape, self.image_size)
         self._model_complete = False
 
+        # an optional dict shared by the models made from the same input
+        # image (e.g. in the GUI), used to reuse the prepared data
+        self.prepared_data_cache = None
+
         self.texture_order = ['small_dots', 'dots', 'lines']
         self.region_mask_types = ['smooth', 'remove_star']
 
@@ -147,7 +161,19 @@ class Model3D(object):
         """
 
         log.info('Reading FITS data from "{0}"'.format(filename))
-        data = fits.getdata(filename)
+        # astropy memory maps unscaled data by default (so only the pages
+        # that are actually used are read), and reads scaled data (BZERO,
+        # BSCALE or BLANK keywords) into memory
+        data = None
+        with fits.open(filename) as hdulist:
+            # select the first image HDU from its header, without
+            # reading the data of any other HDUs
+            for hdu in hdulist:
+                if (isinstance(hdu, (fits.PrimaryHDU, fits.ImageHDU,
+                                     fits.CompImageHDU)) and
+                        hdu.header.get('NAXIS', 0) >= 2):
+                    data = hdu.data
+                    break
         if data is None:
             raise ValueError('data not found in the FITS file')
 
@@ -156,7 +182,11 @@ class Model3D(object):
 
         if data.ndim == 3:    # RGB cube
             log.info('Converting RGB FITS cube to 2D data array')
-            data = data[0] * 0.299 + data[1] * 0.587 + data[2] * 0.144
+            # accumulate the weighted channels in a single output array
+            rgb = data
+            data = rgb[0] * 0.299
+            data += rgb[1] * 0.587
+            data += rgb[2] * 0.144
             data = image_utils.remove_nonfinite(data)
 
         return cls(data)
@@ -269,6 +299,14 @@ class Model3D(object):
 
         region_mask = RegionMask.from_fits(
             filename, required_shape=self.data_original.shape)
+        return self._add_loaded_mask(region_mask, filename)
+
+    def _add_loaded_mask(self, region_mask, filename):
+        """
+        Add a region mask read from a FITS file (see `add_mask`) and log
+        it.
+        """
+
         mask_type = self.add_mask(region_mask)
         log.info('Loaded "{0}" mask from "{1}"'.format(mask_type, filename))
         return mask_type
@@ -291,8 +329,16 @@ class Model3D(object):
         >>> model3d.read_all_masks('masks/*.fits')
         """
 
-        for filename in glob.iglob(pathname):
-            self.read_mask(filename)
+        # read the files concurrently (the FITS I/O releases the GIL),
+        # but add the masks in the original order
+        filenames = list(glob.iglob(pathname))
+        read = partial(RegionMask.from_fits,
+                       required_shape=self.data_original.shape)
+        with ThreadPoolExecutor() as executor:
+            region_masks = list(executor.map(read, filenames))
+
+        for filename, region_mask in zip(filenames, region_masks):
+            self._add_loaded_mask(region_mask, filename)
 
     def write_all_masks(self, filename_prefix):
         """
@@ -312,6 +358,7 @@ class Model3D(object):
             '<filename_prefix>_<mask_type>_<num>.fits'.
         """
 
+        writes = []
         for mask_type, masks in self.region_masks_original.items():
             nmasks = len(masks)
             for i, mask in enumerate(masks, 1):
@@ -321,7 +368,7 @@ class Model3D(object):
                 else:
                     filename = '{0}_{1}.fits'.format(filename_prefix,
                                                      mask_type)
-                mask.write(filename)
+                writes.append((mask, filename))
         for texture_type, masks in self.texture_masks_original.items():
             nmasks = len(masks)
             for i, mask in enumerate(masks, 1):
@@ -332,7 +379,12 @@ class Model3D(object):
                 else:
                     filename = '{0}_{1}.fits'.format(filename_prefix,
                                                      mask_type)
-                mask.write(filename)
+                writes.append((mask, filename))
+
+        # the FITS writes are I/O bound, so write the files concurrently
+        # (consuming the results re-raises any write errors)
+        with ThreadPoolExecutor() as executor:
+            list(executor.map(lambda args: args[0].write(args[1]), writes))
 
     def add_stellar_table(self, table, stellar_type):
         """
@@ -560,21 +612,47 @@ class Model3D(object):
 
         log.info('Preparing data (resizing).')
 
-        self.data_original_resized = image_utils.resize_image(
-            image_utils.remove_nonfinite(self.data_original),
-            self._resize_scale_factor)
-        self.data = deepcopy(self.data_original_resized)
+        dtype = self.dtype
+        if dtype is None:
+            dtype = self.data_original.dtype
+            if not np.issubdtype(dtype, np.floating):
+                dtype = np.float64
+        # FITS data are big-endian; use the native byte order so the
+        # rest of the pipeline does not byte swap on every operation
+        dtype = np.dtype(dtype).newbyteorder('=')
+
+        key = (dtype, self._resize_scale_factor)
+        cache = self.prepared_data_cache
+        if cache is not None and cache.get('key') == key:
+            log.info('Using the previously prepared data.')
+            self.data_original_resized = cache['data']
+        else:
+            data = image_utils.remove_nonfinite(self.data_original)
+            self.data_original_resized = image_utils.resize_image(
+                data.astype(dtype, copy=False), self._resize_scale_factor)
+
+            if cache is not None:
+                # the prepared data are shared by all the models using
+                # the cache, so protect them (a view, as they may be the
+                # input image itself)
+                data = self.data_original_resized.view()
+                data.flags.writeable = False
+                self.data_original_resized = data
+                cache.clear()
+                cache.update(key=key, data=data)
+
+        self.data = self.data_original_resized.copy()
 
     def _prepare_flux(self):
         """Ensure flux column has data.
         """
         for table_type, table in self.stellar_tables_original.items():
-            if all(table['flux'] == 0.0):
-                for row in table:
-                    row['flux'] = self.data_original[
-                        int(row['xcentroid']),
-                        int(row['ycentroid'])
-                    ]
+            if np.all(table['flux'] == 0.0):
+                # truncate the positions like int() and look up all the
+                # fluxes at once
+                xcen = np.asarray(table['xcentroid']).astype(int)
+                ycen = np.asarray(table['ycentroid']).astype(int)
+                table['flux'][:] = self.data_original[xcen, ycen]
 
     def _prepare_masks(self):
         """
@@ -586,21 +664,29 @@ class Model3D(object):
 
         log.info('Preparing masks (combining and resizing).')
 
-        self.texture_masks = {}
-        self.region_masks = {}
-
-        # combine and resize texture_masks
-        for mask_type, masks in self.texture_masks_original.items():
-            prepared_mask = image_utils.resize_image(
-                image_utils.combine_region_masks(masks),
-                self._resize_scale_factor)
-            self.texture_masks[mask_type] = prepared_mask   # ndarray
-
-        # resize but do not combine region_masks
-        for mask_type, masks in self.region_masks_original.items():
-            resized_masks = [image_utils.resize_image(
-                mask.mask, self._resize_scale_factor) for mask in masks]
-            self.region_masks[mask_type] = resized_masks   # list of ndarrays
+        # the resizes are independent and release the GIL, so run them
+        # concurrently
+        scale_factor = self._resize_scale_factor
+        with ThreadPoolExecutor() as executor:
+            # combine and resize texture_masks
+            texture_futures = {
+                mask_type: executor.submit(
+                    image_utils.resize_image,
+                    image_utils.combine_region_masks(masks), scale_factor)
+                for mask_type, masks in self.texture_masks_original.items()}
+
+            # resize but do not combine region_masks
+            region_futures = {
+                mask_type: [executor.submit(mask.resize, scale_factor)
+                            for mask in masks]
+                for mask_type, masks in self.region_masks_original.items()}
+
+        self.texture_masks = {    # ndarray
+            mask_type: future.result()
+            for mask_type, future in texture_futures.items()}
+        self.region_masks = {    # list of ndarrays
+            mask_type: [future.result() for future in futures]
+            for mask_type, futures in region_futures.items()}
 
     @staticmethod
     def _scale_table_positions(table, resize_scale):
@@ -718,12 +804,16 @@ class Model3D(object):
         except KeyError:
             log.warning('A "bulge" mask must be defined.')
             return None
-        base_level = np.percentile(self.data[bulge_mask],
-                                   percentile)
+        # the masked values are a temporary copy, so let the percentile
+        # partition them in place
+        base_level = np.percentile(self.data[bulge_mask], percentile,
+                                   overwrite_input=True)
+        # update the values above the base level in place, without
+        # gathering them into temporary arrays
         compress_mask = self.data > base_level
-        new_values = (base_level + (self.data[compress_mask] -
-                                    base_level) * factor)
-        self.data[compress_mask] = new_values
+        np.subtract(self.data, base_level, out=self.data, where=compress_mask)
+        np.multiply(self.data, factor, out=self.data, where=compress_mask)
+        np.add(self.data, base_level, out=self.data, where=compress_mask)
 
         return base_level
 
@@ -766,11 +856,14 @@ class Model3D(object):
         log.info('Suppressing the background.')
         texture_masks = [self.texture_masks[i] for i in self.texture_masks]
         mask = image_utils.combine_masks(texture_masks)
-        zero_mask = (self.data == 0.)
-        mask = np.logical_or(mask, zero_mask)
-        background_level = np.percentile(self.data[~mask], percentile)
+        # nonzero pixels outside of all texture masks, built in a single
+        # boolean buffer
+        bkgrd_pixels = (self.data != 0.)
+        bkgrd_pixels[mask] = False
+        background_level = np.percentile(self.data[bkgrd_pixels], percentile,
+                                         overwrite_input=True)
         bkgrd_mask = self.data < background_level
-        self.data[bkgrd_mask] = self.data[bkgrd_mask] * factor
+        np.multiply(self.data, factor, out=self.data, where=bkgrd_mask)
         floor = np.percentile(self.data, floor_percentile)
         self.data[self.data < floor] = 0.
         return background_level
@@ -787,12 +880,13 @@ class Model3D(object):
             or 0., then no smoothing will be performed.
         """
 
-        if size is None or size == 0.:
+        # a filter size of 1 leaves the image unchanged
+        if size is None or np.all(np.asarray(size) <= 1):
             return
 
         log.info('Smoothing the image with a 2D median filter of size '
                  '{0} pixels.'.format(size))
-        self.data = ndimage.filters.median_filter(self.data, size=size)
+        self.data = image_utils.median_filter(self.data, size=size)
 
     def _normalize_image(self, max_value=1.0):
         """
@@ -806,7 +900,8 @@ class Model3D(object):
 
         log.info('Normalizing the image values to [0, {0}].'
                  .format(max_value))
-        self.data = image_utils.normalize_data(self.data, max_value=max_value)
+        image_utils.normalize_data(self.data, max_value=max_value,
+                                   out=self.data)
 
     def _minvalue_to_zero(self, min_value=0.02):
         """
@@ -837,22 +932,21 @@ class Model3D(object):
 
         log.info('Extracting source label: {0}'.format(label))
         segm.keep_labels(label)
-        segm_mask = ~segm.data.astype(bool)
+        segm_pixels = segm.data.astype(bool)
+        segm_mask = ~segm_pixels
         self.data *= segm_mask
 
         for mask_type, mask in self.texture_masks.items():
             log.info('Masking the texture masks for the extracted galaxy.')
-            mask[~segm_mask] = 0
+            mask[segm_pixels] = 0
             self.texture_masks[mask_type] = mask
 
         log.info('Pruning the stellar tables for the extracted galaxy.')
         for stellar_type, table in self.stellar_tables.items():
-            values = []
-            for row in table:
-                x = int(round(row['xcentroid']))
-                y = int(round(row['ycentroid']))
-                values.append(self.data[y, x])
-            values = np.array(values)
+            # round half to even, like round(), for all rows at once
+            x = np.rint(np.asarray(table['xcentroid'])).astype(int)
+            y = np.rint(np.asarray(table['ycentroid'])).astype(int)
+            values = self.data[y, x]
             idx = np.where(values == 0.)
             table.remove_rows(idx)
             self.stellar_tables[stellar_type] = table
@@ -892,25 +986,24 @@ class Model3D(object):
         log.info('Cropping the image using a threshold of {0} to define '
                  'the minimal bounding box'.format(threshold))
         slc = image_utils.bbox_threshold(self.data, threshold=threshold)
-        self.data = self.data[slc]
         if pad_width != 0:
             log.info('Padding the image by {0} pixels.'.format(pad_width))
-            self.data = np.pad(self.data, pad_width, mode=str('constant'))
+        self.data = image_utils.crop_pad(self.data, slc, pad_width)
 
         for mask_type, mask in self.texture_masks.items():
             log.info('Cropping "{0}" mask.'.format(mask_type))
-            self.texture_masks[mask_type] = mask[slc]
             if pad_width != 0:
                 log.info('Padding the mask by {0} pixels.'.format(pad_width))
-                self.texture_masks[mask_type] = np.pad(
-                    self.texture_masks[mask_type], pad_width,
-                    mode=str('constant'))
+            self.texture_masks[mask_type] = image_utils.crop_pad(
+                mask, slc, pad_width)
 
         for stellar_type, table in self.stellar_tables.items():
-            idx = ((table['xcentroid'] > slc[1].start) &
-                   (table['xcentroid'] < slc[1].stop) &
-                   (table['ycentroid'] > slc[0].start) &
-                   (table['ycentroid'] < slc[0].stop))
+            # select the rows on the plain column arrays (indexing the
+            # table then copies only the selected rows)
+            xcen = np.asarray(table['xcentroid'])
+            ycen = np.asarray(table['ycentroid'])
+            idx = ((xcen > slc[1].start) & (xcen < slc[1].stop) &
+                   (ycen > slc[0].start) & (ycen < slc[0].stop))
             table = table[idx]
             table['xcentroid'] -= slc[1].start - pad_width
             table['ycentroid'] -= slc[0].start - pad_width
@@ -939,7 +1032,8 @@ class Model3D(object):
         positions.
 
         If a ``mask`` is input, then only those regions will be
-        considered.
+        considered.  If the ``mask`` is empty, then the image center is
+        used (with a warning).
 
         Parameters
         ----------
@@ -947,13 +1041,26 @@ class Model3D(object):
             Boolean mask where to search for the maximum value.
         """
 
-        # use np.where instead of np.argmax in case of multiple
-        # occurrences of the maximum value
+        # average all occurrences of the maximum value (np.argmax
+        # returns only the first one)
         if mask is None:
-            y, x = np.where(self.data == self.data.max())
+            data = self.data.ravel()
+            idx = np.argmax(data)
+            # any other occurrences can only follow the first one
+            idx = idx + np.flatnonzero(data[idx:] == data[idx])
+            y, x = np.unravel_index(idx, self.data.shape)
+        elif not mask.any():
+            warnings.warn('The mask to find the galaxy center is empty; '
+                          'using the image center.', AstropyUserWarning)
+            ny, nx = self.data.shape
+            y, x = np.array([(ny - 1) / 2.]), np.array([(nx - 1) / 2.])
         else:
-            data = np.ma.array(self.data, mask=~mask)
-            y, x = np.where(data == data.max())
+            # search only the values at the mask coordinates instead of
+            # a full-size masked array
+            y, x = np.nonzero(mask)
+            data = self.data[y, x]
+            idx = (data == data.max())
+            y, x = y[idx], x[idx]
         y_center = y.mean()
         x_center = x.mean()
         log.info('Found center of galaxy at x={0}, y={1}.'
@@ -1001,11 +1108,12 @@ class Model3D(object):
         base_height = stellar_base_height(self.data, cusp, stellar_mask=None,
                                           selem=selem)
 
-        self._cusp_texture = np.zeros(self.data.shape)
+        self._cusp_texture = np.zeros(self.data.shape, dtype=self.data.dtype)
         cusp.render(self._cusp_texture)
         self._cusp_base_height = np.zeros_like(self.data)
         self._cusp_mask = (self._cusp_texture != 0)
         self._cusp_base_height[self._cusp_mask] = base_height
+        self._cusp_base_height_value = base_height
 
     def _make_intensity_height(self, intensity_height=27.5):
         """
@@ -1028,11 +1136,10 @@ class Model3D(object):
 
         # replace the image values within the cusp with the cusp base height
         if self._cusp_texture is not None and self._has_intensity:
-            base_height = self._cusp_base_height.max()
             log.info('Clipping image values in cusp at {0} (for central '
-                     'cusp).'.format(base_height))
-            self.data[self._cusp_mask] = \
-                self._cusp_base_height[self._cusp_mask]
+                     'cusp).'.format(self._cusp_base_height_value))
+            np.copyto(self.data, self._cusp_base_height,
+                      where=self._cusp_mask)
 
         self._normalize_image(max_value=intensity_height)
 
@@ -1056,11 +1163,15 @@ class Model3D(object):
         for texture_type in self.texture_order:
             if texture_type not in self.texture_masks:
                 continue
+            mask = self.texture_masks[texture_type]
+            if not mask.any():
+                continue
 
             log.info('Adding "{0}" textures.'.format(texture_type))
-            mask = self.texture_masks[texture_type]
-            texture_data = self.textures[texture_type](mask.shape, mask=mask)
-            self._texture_layer[mask] = texture_data[mask]
+            # layer the masked texture directly into the texture layer,
+            # in order
+            self.textures[texture_type](mask.shape, mask=mask,
+                                        out=self._texture_layer)
 
         self._textures_all = self._texture_layer.copy()
         self.data += self._texture_layer
@@ -1131,11 +1242,11 @@ class Model3D(object):
         # replace image values with the stellar texture base heights
         log.info('Adding stellar-like textures.')
         stellar_mask = (self._stellar_texture_layer != 0)
-        self._textures_all[stellar_mask] = \
-            self._stellar_texture_layer[stellar_mask]
+        np.copyto(self._textures_all, self._stellar_texture_layer,
+                  where=stellar_mask)
         self._stellar_base_heights = base_heights
 
-        self.data[stellar_mask] = base_heights[stellar_mask]
+        np.copyto(self.data, base_heights, where=stellar_mask)
         self.data += self._stellar_texture_layer
 
     def _apply_textures(self, star_radius_a=10., star_radius_b=5.,
@@ -1184,11 +1295,11 @@ class Model3D(object):
                 if not self._has_intensity:
                     self._cusp_base_height *= 0.
 
-                self.data[self._cusp_mask] = \
-                    self._cusp_base_height[self._cusp_mask]
+                np.copyto(self.data, self._cusp_base_height,
+                          where=self._cusp_mask)
                 self.data += self._cusp_texture
-                self._textures_all[self._cusp_mask] = \
-                    self._cusp_texture[self._cusp_mask]
+                np.copyto(self._textures_all, self._cusp_texture,
+                          where=self._cusp_mask)
 
     def _make_model_base(self, base_height=5.0, filter_size=10,
                          min_thickness=0.5, fill_holes=True):
@@ -1230,20 +1341,37 @@ class Model3D(object):
 
         if self._double_sided and self._has_intensity:
             data_mask = self.data.astype(bool)
-            selem = np.ones((filter_size, filter_size))
-            dilation_mask = ndimage.binary_dilation(data_mask,
-                                                    structure=selem)
-            self._base_layer = np.where(dilation_mask == 0, base_height, 0)
-            if fill_holes:
-                galaxy_mask = ndimage.binary_fill_holes(data_mask)
-                holes_mask = galaxy_mask * ~data_mask
-                self._base_layer[holes_mask] = base_height
+            dilation_mask = np.zeros(data_mask.shape, dtype=bool)
+            if np.any(data_mask):
+                # the dilation and hole filling can only change pixels
+                # near the bounding box of the data, so restrict them to
+                # that region
+                slc = image_utils.bbox_threshold(data_mask)
+                slc_dilation = tuple(
+                    slice(max(s.start - filter_size, 0), s.stop + filter_size)
+                    for s in slc)
+                # dilation by a square is a (separable) maximum filter;
+                # shift even-sized windows like binary_dilation does
+                dilation_mask[slc_dilation] = ndimage.maximum_filter(
+                    data_mask[slc_dilation], size=filter_size,
+                    mode='constant', cval=0, origin=(filter_size % 2) - 1)
+                if fill_holes:
+                    # the holes get the full base height, so exclude them
+                    # from the dilation mask instead of filling them in a
+                    # second pass
+                    galaxy_mask = ndimage.binary_fill_holes(data_mask[slc])
+                    holes_mask = galaxy_mask & ~data_mask[slc]
+                    dilation_mask[slc][holes_mask] = False
+            # add the base height outside of the dilated data in place,
+            # instead of building a full-size float64 base layer (the
+            # float64 scalar keeps the addition in double precision)
+            np.add(self.data, np.float64(base_height), out=self.data,
+                   where=~dilation_mask)
         else:
-            self._base_layer = base_height
-        self.data += self._base_layer
+            self.data += base_height
 
         min_value = min_thickness / self.mm_per_pixel    # pixels
-        self.data[self.data < min_value] = min_value
+        np.maximum(self.data, min_value, out=self.data)
 
     def make(self, split_model=True, split_model_axis=0, intensity=True,
              textures=True, double_sided=False, spiral_galaxy=False,
@@ -1460,7 +1588,7 @@ class Model3D(object):
 
         self._make_intensity_height(intensity_height=intensity_height)
 
-        self.data_intensity = deepcopy(self.data)
+        self.data_intensity = self.data.copy()
         if not self._has_intensity:
             log.info('Discarding data intensity.')
             self.data *= 0.
@@ -1547,34 +1675,48 @@ class Model3D(object):
         if min_count > max_count:
             raise ValueError('min_count must be <= max_count')
 
-        self.data = deepcopy(self.data_original_resized)
+        self.data = self.data_original_resized.copy()
+
+        # the background statistics do not depend on snr, so compute
+        # them only once; the (constant) detection threshold is then
+        # simply a scalar for each snr
+        _, background, error = sigma_clipped_stats(
+            self.data, mask_value=0.0, sigma=3.0, maxiters=sigclip_iters)
 
         columns = ['id', 'xcentroid', 'ycentroid', 'segment_sum']
         while snr >= snr_min:
-            threshold = photutils.detect_threshold(
-                self.data, snr=snr, mask_value=0.0,
-                sigclip_iters=sigclip_iters)
+            threshold = background + (error * snr)
             segm_img = photutils.detect_sources(self.data, threshold,
                                                 npixels=npixels)
-            segm_props = photutils.source_properties(self.data, segm_img)
-            tbl = photutils.properties_table(segm_props, columns=columns)
 
-            if len(tbl) >= min_count:
+            # the number of sources is the number of segments, so the
+            # source properties are needed only for the final snr
+            if segm_img.nlabels >= min_count or (snr - 1.) < snr_min:
                 break
             else:
                 snr -= 1.
 
-        tbl.sort('segment_sum')
-        tbl.reverse()
+        segm_props = photutils.source_properties(self.data, segm_img)
+        tbl = photutils.properties_table(segm_props, columns=columns)
+
+        # select the max_count brightest sources with a partial sort, so
+        # that only the kept rows are fully sorted, and gather the sorted
+        # rows from the table only once
+        flux = np.asarray(tbl['segment_sum'])
         if len(tbl) > max_count:
-            tbl = tbl[:max_count]
+            idx = np.argpartition(-flux, max_count - 1)[:max_count]
+        else:
+            idx = np.arange(len(tbl))
+        idx = idx[np.argsort(flux[idx])[::-1]]
+        tbl = tbl[idx]
         tbl.rename_column('segment_sum', 'flux')
 
         scaled_tbl = self._scale_table_positions(
             tbl, 1. / self._resize_scale_factor)
         self.stellar_tables_original[stellar_type] = scaled_tbl
 
-        self.stellar_tables = deepcopy(self.stellar_tables_original)
+        self.stellar_tables = {key: table.copy() for key, table in
+                               self.stellar_tables_original.items()}
         self.stellar_tables[stellar_type] = tbl
 
         return self.stellar_tables_original
@@ -1617,7 +1759,7 @@ class Model3D(object):
                              '{1} percentile.'.format(texture1, texture2))
 
         self._prepare_data()
-        self.data = deepcopy(self.data_original_resized)
+        self.data = self.data_original_resized.copy()
         self._prepare_masks()
         self._remove_stars()
         self._smooth_image(size=smooth_size)
@@ -1630,7 +1772,9 @@ class Model3D(object):
             minval = rwm[~bulge_mask].min()
             rwm[bulge_mask] = 0.     # exclude the bulge mask region
             rwm /= minval      # min weight value outside of bulge is now 1.
-            data = self.data * rwm
+            # the weight map is not needed afterwards, so reuse its
+            # buffer for the weighted data
+            data = np.multiply(self.data, rwm, out=rwm)
         else:
             data = self.data
 
@@ -1638,13 +1782,17 @@ class Model3D(object):
         # outside coverage area due to rotation or mosaic)
         coverage_mask = (data != 0)
 
+        # compute both thresholds from a single selection pass
+        threshold1, threshold2 = np.percentile(
+            data[coverage_mask], [percentile1, percentile2],
+            overwrite_input=True)
+
         # define the first mask (e.g. "spiral arms" or "dust")
-        threshold2 = np.percentile(data[coverage_mask], percentile2)
         mask2 = (data > threshold2)
 
         # define the second mask (e.g. "gas")
-        threshold1 = np.percentile(data[coverage_mask], percentile1)
-        mask1 = np.logical_and(data > threshold1, ~mask2)
+        mask1 = (data > threshold1)
+        mask1[mask2] = False
 
         new_regions = []
         for mask_type, mask in zip([texture1, texture2], [mask1, mask2]):
@@ -1801,9 +1949,6 @@ def replace_mask_by_interpolation(data, mask):
         The mask
     """
 
-    # Get all image coordinates
-    image_x, image_y = np.mgrid[:data.shape[0], :data.shape[1]]
-
     # Get mask coordinates
     mask_x, mask_y = mask.nonzero()
 
@@ -1813,24 +1958,22 @@ def replace_mask_by_interpolation(data, mask):
     fit_mask = mask.copy()
     fit_mask[mask_x_large, mask_y_large] = True
 
-    # Next, remove the original mask and invert to mask out
-    # everything else except the edges of the original mask.
+    # Next, remove the original mask to leave only the edges of the
+    # original mask.
     fit_mask[mask] = False
-    fit_mask = ~fit_mask
 
     # Get the edge data
-    edge_data = ma.array(data, mask=fit_mask)
-    edge_x, edge_y = edge_data.nonzero()
-    edge_valid_data = edge_data.compressed()
+    edge_x, edge_y = fit_mask.nonzero()
+    edge_valid_data = data[edge_x, edge_y]
 
-    # Calculate the interpolation
-    interpolation = griddata(
-        list(zip(edge_x, edge_y)), edge_valid_data, (image_x, image_y), method='linear'
+    # Calculate the interpolation, only at the masked pixels
+    replacement = griddata(
+        np.column_stack((edge_x, edge_y)), edge_valid_data, (mask_x, mask_y),
+        method='linear'
     )
-    replacement = interpolation[mask_x, mask_y]
 
     # Replace in the original data
-    data[mask] = replacement
+    data[mask_x, mask_y] = replacement
 
 
 def grow_region(x, y, npixels=3):
@@ -1846,31 +1989,15 @@ def grow_region(x, y, npixels=3):
     x_grow, y_grow: ndarray
         The new, larger region
     """
-    x_grow = x
-    y_grow = y
+    # offsets of each pixel's 3x3 neighborhood
+    offsets = np.array([[0, 0, 0, 1, 1, 1, -1, -1, -1],
+                        [0, 1, -1, 0, 1, -1, 0, 1, -1]])
 
+    coords = np.vstack((x, y))
     for idx in range(npixels):
-        x_grow = np.concatenate((
-            x_grow,
-            x_grow,
-            x_grow,
-            x_grow + 1,
-            x_grow + 1,
-            x_grow + 1,
-            x_grow - 1,
-            x_grow - 1,
-            x_grow - 1,
-        ))
-        y_grow = np.concatenate((
-            y_grow,
-            y_grow + 1,
-            y_grow - 1,
-            y_grow,
-            y_grow + 1,
-            y_grow - 1,
-            y_grow,
-            y_grow + 1,
-            y_grow - 1,
-        ))
-
-    return x_grow, y_grow
+        coords = coords[:, :, np.newaxis] + offsets[:, np.newaxis, :]
+        # remove the duplicates from overlapping neighborhoods, which
+        # otherwise grow the number of coordinates by 9x per pixel
+        coords = np.unique(coords.reshape(2, -1), axis=1)
+
+    return coords[0], coords[1]
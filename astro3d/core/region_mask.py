@@ -4,7 +4,7 @@ from __future__ import (absolute_import, division, print_function,
 import numpy as np
 from astropy import log
 from astropy.io import fits
-from .image_utils import resize_image_absolute
+from .image_utils import resize_image, resize_image_absolute
 
 
 class RegionMask(object):
@@ -46,6 +46,46 @@ class RegionMask(object):
             self.mask = resize_image_absolute(self.mask, x_size=shape[1],
                                               y_size=shape[0])
 
+    @property
+    def mask(self):
+        """The 2D boolean image defining the region mask."""
+        return self._mask
+
+    @mask.setter
+    def mask(self, value):
+        self._mask = value
+        self._resize_cache = {}
+
+    def resize(self, scale_factor):
+        """
+        Resize the region mask by the given scale factor.
+
+        The resized masks are cached by ``scale_factor`` (and returned
+        as read-only arrays), so that building a model repeatedly from
+        the same region masks does not resize them again.  The cache is
+        cleared when `mask` is reassigned.
+
+        Parameters
+        ----------
+        scale_factor : float
+            The scale factor to apply to the mask.
+
+        Returns
+        -------
+        result : `~numpy.ndarray`
+            The resized mask.
+        """
+
+        if scale_factor == 1:
+            return self.mask
+
+        mask = self._resize_cache.get(scale_factor)
+        if mask is None:
+            mask = resize_image(self.mask, scale_factor)
+            mask.flags.writeable = False
+            self._resize_cache[scale_factor] = mask
+        return mask
+
     def write(self, filename, shape=None):
         """
         Write the region mask to a FITS file.
@@ -106,9 +146,8 @@ class RegionMask(object):
             A `RegionMask` instance.
         """
 
-        fobj = fits.open(filename)
-        header = fobj[0].header
-        mask = fobj[0].data.astype(np.bool)
+        data, header = fits.getdata(filename, header=True)
+        mask = data.astype(bool)
         mask_type = header['MASKTYPE']
         region_mask = cls(mask, mask_type, required_shape=required_shape,
                           shape=shape)
@@ -7,6 +7,7 @@ import warnings
 from astropy import log
 from astropy.modeling import Parameter, Fittable2DModel
 from astropy.modeling.models import Disk2D
+from astropy.nddata.utils import NoOverlapError, overlap_slices
 from astropy.utils.exceptions import AstropyUserWarning
 import numpy as np
 from scipy.ndimage import binary_dilation
@@ -25,7 +26,7 @@ __all__ = [
 log.setLevel('DEBUG')
 
 
-def mask_texture_image(texture_image, mask):
+def mask_texture_image(texture_image, mask, out=None):
     """
     Mask a texture image.
 
@@ -38,21 +39,125 @@ def mask_texture_image(texture_image, mask):
         A 2D boolean mask.  The texture will be removed where the
         ``mask`` is `False` and applied only where ``mask`` is `True`.
 
+    out : `~numpy.ndarray`, optional
+        An existing image in which to place the masked textures.  Its
+        values where ``mask`` is `False` are left unchanged.
+
     Returns
     -------
     data : `~numpy.ndarray`
         An image containing the masked textures.
     """
 
+    if mask is not None and texture_image.shape != mask.shape:
+        raise ValueError('texture_image and mask must have the same shape')
+
+    if out is not None:
+        np.copyto(out, texture_image, where=(True if mask is None else mask))
+        return out
+
     if mask is None:
         return texture_image
 
-    if texture_image.shape != mask.shape:
-        raise ValueError('texture_image and mask must have the same shape')
+    return np.where(mask, texture_image, 0.)
+
+
+def _render_slices(model, shape, pad=0):
+    """
+    Calculate the slices of the image window that contains all the
+    pixels that ``model.render`` can modify.
+
+    Parameters
+    ----------
+    model : `~astropy.modeling.Model`
+        A 2D model with a ``bounding_box``.
+
+    shape : tuple
+        The shape of the image where the model will be rendered.
+
+    pad : int, optional
+        The number of additional pixels to pad the window on each side.
+
+    Returns
+    -------
+    slices : tuple of slice objects or `None`
+        The ``(y, x)`` slices of the window, clipped to the image
+        shape.  `None` is returned if the window does not overlap with
+        the image.
+    """
+
+    bbox = model.bounding_box
+    if hasattr(bbox, 'bounding_box'):    # astropy >= 5.0
+        bbox = bbox.bounding_box()
+
+    # render centers its box at int(mean) with a half width of
+    # ceil(extent / 2), which stays within 2 pixels of the bounding box
+    pad += 2
+    slices = []
+    for (lower, upper), size in zip(bbox, shape):
+        start = max(int(np.floor(lower)) - pad, 0)
+        stop = min(int(np.ceil(upper)) + pad + 1, size)
+        if start >= stop:
+            return None
+        slices.append(slice(start, stop))
+
+    return tuple(slices)
+
+
+def _render_stamp(model, shape, pad=0):
+    """
+    Render a model and return the image window containing it.
 
-    data = np.zeros_like(mask, dtype=np.float)
-    data[mask] = texture_image[mask]
-    return data
+    Only the window is allocated, not the full image.
+
+    Parameters
+    ----------
+    model : `~astropy.modeling.Model`
+        A 2D model with a ``bounding_box``.
+
+    shape : tuple
+        The shape of the image where the model will be rendered.
+
+    pad : int, optional
+        The number of additional pixels to pad the window on each side.
+
+    Returns
+    -------
+    slices : tuple of slice objects or `None`
+        The ``(y, x)`` slices of the window (see `_render_slices`).
+        `None` is returned if the model does not overlap with the
+        image, in which case it is not rendered.  This includes models
+        whose bounding box is just outside of the image, for which
+        ``model.render`` on the full image raises a `ValueError`.
+
+    stamp : `~numpy.ndarray` or `None`
+        The rendered model values within the window.
+    """
+
+    slc = _render_slices(model, shape, pad=pad)
+    if slc is None:
+        # skip models entirely outside of the image
+        return None, None
+
+    # render evaluates the model over its bounding box (centered at
+    # int(mean) with a half width of ceil(extent / 2)) and adds the
+    # result to the image at that position; do the same in the window
+    bbox = model.bounding_box
+    if hasattr(bbox, 'bounding_box'):    # astropy >= 5.0
+        bbox = bbox.bounding_box()
+    position = [int(np.mean(bb)) - s.start for bb, s in zip(bbox, slc)]
+
+    values = model.render()
+    stamp = np.zeros([s.stop - s.start for s in slc])
+    try:
+        stamp_slc, values_slc = overlap_slices(stamp.shape, values.shape,
+                                               position)
+    except NoOverlapError:
+        # the padded window overlaps the image, but not the model
+        return None, None
+    stamp[stamp_slc] += values[values_slc]
+
+    return slc, stamp
 
 
 class SquareGrid(object):
@@ -221,11 +326,15 @@ class LinesTexture(object):
         self.height = height
         self.spacing = spacing
         self.orientation = orientation
+        self._cache = None    # (key, unmasked texture image)
 
-    def __call__(self, shape, mask=None):
+    def __call__(self, shape, mask=None, out=None):
         """
         Create a texture image of lines.
 
+        The unmasked texture image is cached for the most recent
+        ``shape`` and texture parameters only.
+
         Parameters
         ----------
         shape : tuple
@@ -236,23 +345,69 @@ class LinesTexture(object):
             where the ``mask`` is `True`.  ``mask`` must have the same
             shape as the input ``shape``.
 
+        out : `~numpy.ndarray`, optional
+            An existing image of the input ``shape`` in which to place
+            the texture (e.g. to layer several textures).  Its values
+            outside of the ``mask`` are left unchanged.
+
         Returns
         -------
         data : `~numpy.ndarray`
             An image containing the line texture.
         """
 
+        data = self.prepare(shape)
+        if data.shape != tuple(shape):
+            raise ValueError('the texture image does not have the '
+                             'requested shape')
+
+        if mask is None and out is None:
+            return data.copy()
+        return mask_texture_image(data, mask, out=out)
+
+    def prepare(self, shape):
+        """
+        Create (and cache) the unmasked texture image of lines for the
+        given ``shape``.
+
+        Parameters
+        ----------
+        shape : tuple
+            The shape of the texture image.
+
+        Returns
+        -------
+        data : `~numpy.ndarray`
+            The cached unmasked texture image.  It must not be modified.
+        """
+
+        shape = tuple(shape)
+        key = (shape, self.profile, self.thickness, self.height,
+               self.spacing, self.orientation)
+        # the texture may be shared by models made concurrently (e.g.
+        # in the GUI), so read and replace the cache only as a whole
+        cache = self._cache
+        if cache is not None and cache[0] == key:
+            return cache[1]
+
+        data = self._make_texture(shape)
+        self._cache = (key, data)
+        return data
+
+    def _make_texture(self, shape):
+        """Create the unmasked texture image of lines."""
+
         # start at the image center and then offset lines in both directions
         xc = shape[1] / 2
         yc = shape[1] / 2
-        x = np.arange(shape[1]) - xc
-        y = np.arange(shape[0]) - yc
-        xp, yp = np.meshgrid(x, y)
+        xp = np.arange(shape[1]) - xc
+        yp = np.arange(shape[0]) - yc
 
         angle = np.pi * self.orientation/180.
         s, c = np.sin(angle), np.cos(angle)
         # x = c*xp + s*yp    # unused
-        y = -s*xp + c*yp
+        # broadcast the 1D coordinates instead of building meshgrids
+        y = -s*xp[np.newaxis, :] + c*yp[:, np.newaxis]
 
         # compute maximum possible offsets
         noffsets = int(np.sqrt(xc**2 + yc**2) / self.spacing)
@@ -272,7 +427,7 @@ class LinesTexture(object):
                     data[idx] = ((self.height / h_thick) *
                                  (h_thick - np.abs(y_diff[idx])))
 
-        return mask_texture_image(data, mask)
+        return data
 
 
 class DotsTexture(object):
@@ -322,35 +477,56 @@ class DotsTexture(object):
     def __init__(self, profile, diameter, height, locations=None, grid=None):
         if int(diameter) != diameter:
             raise ValueError('diameter must be an integer')
-        diameter = int(diameter)
 
         if locations is None:
             if grid is None:
                 raise ValueError('locations or grid must be input')
+
+        if profile not in ('spherical', 'linear'):
+            raise ValueError('profile must be "spherical" or "linear"')
+
+        self.profile = profile
+        self.diameter = int(diameter)
+        self.height = height
         self.locations = locations
         self.grid = grid
-
-        dot_shape = (diameter, diameter)
-        dot = np.zeros(dot_shape)
-        yy, xx = np.indices(dot_shape)
-        radius = (diameter - 1) // 2
-        r = np.sqrt((xx - radius)**2 + (yy - radius)**2)
-        idx = np.where(r < radius)
-
-        if profile == 'spherical':
-            dot[idx] = (height / radius) * np.sqrt(radius**2 - r[idx]**2)
-        elif profile == 'linear':
-            dot[idx] = (height / radius) * np.abs(radius - r[idx])
+        self._cache = None    # (key, unmasked texture image)
+
+    @property
+    def radius(self):
+        """The radius of a dot."""
+        return (int(self.diameter) - 1) // 2
+
+    @property
+    def dot(self):
+        """The image of a single dot."""
+
+        diameter = int(self.diameter)
+        dot = np.zeros((diameter, diameter))
+        radius = self.radius
+        dxy = np.arange(diameter) - radius
+        # compare squared distances (exact for integer offsets) and take
+        # the square root only for the pixels within the dot
+        r2 = dxy[:, np.newaxis]**2 + dxy**2
+        idx = np.where(r2 < radius**2)
+        r = np.sqrt(r2[idx])
+
+        if self.profile == 'spherical':
+            dot[idx] = (self.height / radius) * np.sqrt(radius**2 - r**2)
+        elif self.profile == 'linear':
+            dot[idx] = (self.height / radius) * np.abs(radius - r)
         else:
             raise ValueError('profile must be "spherical" or "linear"')
 
-        self.dot = dot
-        self.radius = radius
+        return dot
 
-    def __call__(self, shape, mask=None):
+    def __call__(self, shape, mask=None, out=None):
         """
         Create a texture image of dots.
 
+        The unmasked texture image is cached for the most recent
+        ``shape`` and texture parameters only.
+
         Parameters
         ----------
         shape : tuple
@@ -361,34 +537,81 @@ class DotsTexture(object):
             where the ``mask`` is `True`.  ``mask`` must have the same
             shape as the input ``shape``.
 
+        out : `~numpy.ndarray`, optional
+            An existing image of the input ``shape`` in which to place
+            the texture (e.g. to layer several textures).  Its values
+            outside of the ``mask`` are left unchanged.
+
         Returns
         -------
         data : `~numpy.ndarray`
             An image containing the dot texture.
         """
 
+        data = self.prepare(shape)
+        if data.shape != tuple(shape):
+            raise ValueError('the texture image does not have the '
+                             'requested shape')
+
+        if mask is None and out is None:
+            return data.copy()
+        return mask_texture_image(data, mask, out=out)
+
+    def prepare(self, shape):
+        """
+        Create (and cache) the unmasked texture image of dots for the
+        given ``shape``.
+
+        Parameters
+        ----------
+        shape : tuple
+            The shape of the texture image.
+
+        Returns
+        -------
+        data : `~numpy.ndarray`
+            The cached unmasked texture image.  It must not be modified.
+        """
+
+        shape = tuple(shape)
         if self.locations is None:
             self.locations = self.grid(shape)
 
+        key = (shape, self.profile, self.diameter, self.height,
+               np.asarray(self.locations).tobytes())
+        # the texture may be shared by models made concurrently (e.g.
+        # in the GUI), so read and replace the cache only as a whole
+        cache = self._cache
+        if cache is not None and cache[0] == key:
+            return cache[1]
+
+        data = self._make_texture(shape)
+        self._cache = (key, data)
+        return data
+
+    def _make_texture(self, shape):
+        """Create the unmasked texture image of dots."""
+
+        dot = self.dot
+        radius = self.radius
         data = np.zeros(shape)
         for (x, y) in self.locations:
             x = np.rint(x).astype(int)
             y = np.rint(y).astype(int)
 
             # exclude points too close to the edge
-            if not (x < self.radius or x > (shape[1] - self.radius - 1) or
-                    y < self.radius or y > (shape[0] - self.radius - 1)):
+            if not (x < radius or x > (shape[1] - radius - 1) or
+                    y < radius or y > (shape[0] - radius - 1)):
                 # replace pixel values in the output texture image only
                 # where the values are larger in the new dot (i.e. the new dot
                 # pixels are not summed with the texture image, but are
                 # assigned the greater value of the new dot and the texture
                 # image)
-                cutout = data[y-self.radius:y+self.radius+1,
-                              x-self.radius:x+self.radius+1]
-                dot_mask = (self.dot > cutout)
-                cutout[dot_mask] = self.dot[dot_mask]
+                cutout = data[y-radius:y+radius+1, x-radius:x+radius+1]
+                dot_mask = (dot > cutout)
+                cutout[dot_mask] = dot[dot_mask]
 
-        return mask_texture_image(data, mask)
+        return data
 
 
 class StarTexture(Fittable2DModel):
@@ -715,11 +938,15 @@ def make_stellar_models(model_type, stellar_table, star_radius_a=10,
     else:
         radius = star_radius_a + (star_radius_b * fluxes / max_flux)
 
+    # iterate over plain column arrays instead of table rows
+    xcentroids = np.asarray(stellar_table['xcentroid'])
+    ycentroids = np.asarray(stellar_table['ycentroid'])
+    radius = np.asarray(radius)
+
     models = []
     base_height = 0.
-    for i, source in enumerate(stellar_table):
-        model = Texture(source['xcentroid'], source['ycentroid'],
-                        radius[i], depth, base_height, slope)
+    for xcen, ycen, rad in zip(xcentroids, ycentroids, radius):
+        model = Texture(xcen, ycen, rad, depth, base_height, slope)
 
         if model is not None:
             models.append(model)
@@ -767,25 +994,47 @@ def stellar_base_height(data, model, stellar_mask=None, selem=None):
     if selem is None:
         selem = np.ones((3, 3))
 
-    model_mask = np.zeros(data.shape)
-    model.render(model_mask)
-    model_mask = (model_mask != 0)
-    if not np.any(model_mask):
+    slc, stamp = _render_stamp(model, data.shape,
+                               pad=max(np.shape(selem)) // 2)
+    model_mask = None if stamp is None else (stamp != 0)
+
+    return _stellar_base_height(data, slc, model_mask,
+                                stellar_mask=stellar_mask, selem=selem)
+
+
+def _stellar_base_height(data, slc, model_mask, stellar_mask=None,
+                         selem=None):
+    """
+    Calculate the base height for a stellar texture from its rendered
+    mask.
+
+    See `stellar_base_height` for a description of the parameters.
+    ``model_mask`` is the boolean mask of the pixels covered by the
+    texture model within the image window given by the ``slc``
+    slices.  The window must be padded by at least half the size of
+    ``selem`` so that the dilated mask is contained within it.
+    """
+
+    if selem is None:
+        selem = np.ones((3, 3))
+
+    if slc is None or not np.any(model_mask):
         # texture contains only zeros (e.g. bad position)
         warnings.warn('stellar model does not overlap with the image.',
                       AstropyUserWarning)
         return None
 
+    # the dilation only needs the window around the model
     model_mask_dilated = binary_dilation(model_mask, selem)
     model_mask_xor = np.logical_xor(model_mask_dilated, model_mask)
 
     if stellar_mask is not None:
-        border_mask = np.logical_and(model_mask_xor, ~stellar_mask)
+        border_mask = np.logical_and(model_mask_xor, ~stellar_mask[slc])
     else:
         border_mask = model_mask_xor
 
     if np.any(border_mask):
-        return np.max(data[border_mask])
+        return np.max(data[slc][border_mask])
     else:
         # no bordering pixels (e.g. texture overlaps others on all
         # sides)
@@ -872,41 +1121,47 @@ def make_stellar_textures(data, stellar_tables, star_radius_a=10,
             cluster_radius_b=cluster_radius_b, depth=depth, slope=slope,
             texture_def=texture_defs.get(stellar_type, None)))
 
+    # render each model only once, keeping the window around it (padded
+    # for the base height dilation)
+    selem = np.ones((3, 3))
+    stamps = [_render_stamp(model, data.shape, pad=1)
+              for model in stellar_models]
+
     # create mask of all stellar textures
     stellar_mask = np.zeros(data.shape)
-    for model in stellar_models:
-        model.render(stellar_mask)
+    for (slc, stamp) in stamps:
+        if slc is not None:
+            stellar_mask[slc] += stamp
     stellar_mask = (stellar_mask != 0)
 
     # define the base heights
     base_heights = []
-    good_models = []
-    selem = np.ones((3, 3))
-    for model in stellar_models:
-        height = stellar_base_height(data, model, stellar_mask=stellar_mask,
-                                     selem=selem)
+    good_stamps = []
+    for (slc, stamp) in stamps:
+        model_mask = None if stamp is None else (stamp != 0)
+        height = _stellar_base_height(data, slc, model_mask,
+                                      stellar_mask=stellar_mask, selem=selem)
         if height is not None:
             base_heights.append(height)
-            good_models.append(model)
+            good_stamps.append((slc, stamp))
 
     # define the stellar textures
     stellar_textures = np.zeros(data.shape)
     base_heights = np.array(base_heights)
     idx = np.argsort(base_heights)
     base_heights = base_heights[idx]
-    good_models = [good_models[i] for i in idx]
+    good_stamps = [good_stamps[i] for i in idx]
 
     base_heights_img = np.zeros(data.shape)
-    for (model, height) in zip(good_models, base_heights):
-        texture = np.zeros(data.shape)
-        model.render(texture)
-        mask = (texture != 0)
+    for ((slc, stamp), height) in zip(good_stamps, base_heights):
+        mask = (stamp != 0)
+        values = stamp[mask]
 
         if exclusion_mask is not None:
-            if np.any(np.logical_and(mask, exclusion_mask)):
+            if np.any(np.logical_and(mask, exclusion_mask[slc])):
                 continue
 
-        stellar_textures[mask] = texture[mask]
-        base_heights_img[mask] = height
+        stellar_textures[slc][mask] = values
+        base_heights_img[slc][mask] = height
 
     return stellar_textures, base_heights_img
@@ -33,6 +33,9 @@ logger = make_null_logger(__name__)
 QStandardItemModel = QtGui.QStandardItemModel
 Qt = QtCore.Qt
 
+# Filename suffixes read directly as FITS images
+FITS_SUFFIXES = ('.fits', '.fit', '.fts', '.fits.gz', '.fit.gz')
+
 
 __all__ = ['Model']
 
@@ -118,13 +121,19 @@ class Model(QStandardItemModel):
                The image data.
         """
         self._image = image
+        # the prepared data are shared by all the models made from the
+        # image
+        self._prepared_data_cache = {}
 
     def read_image(self, pathname):
         """Read image from pathname"""
-        try:
-            m = Model3D.from_rgb(pathname)
-        except Exception:
+        if pathname.lower().endswith(FITS_SUFFIXES):
             m = Model3D.from_fits(pathname)
+        else:
+            try:
+                m = Model3D.from_rgb(pathname)
+            except Exception:
+                m = Model3D.from_fits(pathname)
         self.image = m.data_original
 
     def read_maskpathlist(self, pathlist, container_layer=None):
@@ -193,6 +202,7 @@ class Model(QStandardItemModel):
         if model_params is None:
             model_params = {}
         model3d = Model3D(self.image, **model_params)
+        model3d.prepared_data_cache = self._prepared_data_cache
 
         # Setup textures
         model3d.texture_order = self.texture_defs.texture_order
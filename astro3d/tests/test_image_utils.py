@@ -0,0 +1,67 @@
+"""Test the image utilities"""
+
+from astropy.convolution import convolve
+import numpy as np
+import pytest
+from scipy import ndimage
+
+from astro3d.core import image_utils
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+@pytest.mark.parametrize('size', [3, 5, 4, (3, 5), (4, 3)])
+def test_median_filter(dtype, size):
+    """median_filter matches scipy.ndimage.median_filter"""
+
+    rng = np.random.default_rng(0)
+    data = rng.random((37, 52)).astype(dtype)
+    data[10:20, 5:9] = 0.5    # repeated values
+
+    result = image_utils.median_filter(data, size)
+    expected = ndimage.median_filter(data, size=size)
+    assert result.dtype == expected.dtype
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_remove_nonfinite():
+    """The windowed fill matches filtering the full image"""
+
+    rng = np.random.default_rng(0)
+    data = rng.random((60, 70))
+    data[20, 30] = np.nan
+    data[21:23, 31] = np.inf
+    data[40:50, 50:62] = np.nan    # larger than the filter
+    data[0, 0] = -np.inf    # at the edge
+
+    # the original implementation filtered the full image
+    mask = ~np.isfinite(data)
+    expected = data.copy()
+    expected[mask] = np.nan
+    filt = np.ones((5, 5))
+    data_conv = convolve(expected, filt) / filt.sum()
+    expected[mask] = data_conv[mask]
+    expected[~np.isfinite(expected)] = 0.
+
+    result = image_utils.remove_nonfinite(data)
+    np.testing.assert_array_equal(result, expected)
+    assert np.count_nonzero(np.isnan(data)) == 1 + 10 * 12    # unchanged
+
+
+def test_remove_nonfinite_finite():
+    """Finite data are returned as is"""
+
+    data = np.arange(12.).reshape(3, 4)
+    assert image_utils.remove_nonfinite(data) is data
+
+
+@pytest.mark.parametrize('pad_width', [0, 1, 5])
+def test_crop_pad(pad_width):
+    """crop_pad matches cropping and then padding with numpy.pad"""
+
+    data = np.arange(80.).reshape(8, 10)
+    slc = (slice(2, 7), slice(0, 4))
+
+    result = image_utils.crop_pad(data, slc, pad_width=pad_width)
+    expected = np.pad(data[slc], pad_width, mode='constant')
+    assert result.dtype == data.dtype
+    np.testing.assert_array_equal(result, expected)
@@ -0,0 +1,37 @@
+"""Test making the model base"""
+
+import numpy as np
+import pytest
+from scipy import ndimage
+
+from astro3d.core.model3d import Model3D
+
+
+@pytest.mark.parametrize('fill_holes', [False, True])
+@pytest.mark.parametrize('filter_size', [3, 4, 10, 11])
+def test_model_base_dilation(filter_size, fill_holes):
+    """The windowed maximum filter matches binary_dilation"""
+
+    data = np.zeros((80, 90))
+    data[20:60, 25:70] = 1.
+    data[35:45, 40:50] = 0.    # a hole
+    data[58:62, 68:75] = 2.
+
+    model = Model3D(data)
+    model.data = data.copy()
+    model._double_sided = True
+    model._has_intensity = True
+    model._make_model_base(base_height=2., filter_size=filter_size,
+                           min_thickness=0., fill_holes=fill_holes)
+
+    # the original implementation dilated the full image
+    base_height = 2. / model.mm_per_pixel / 2.
+    data_mask = data.astype(bool)
+    selem = np.ones((filter_size, filter_size))
+    dilation_mask = ndimage.binary_dilation(data_mask, structure=selem)
+    base_layer = np.where(dilation_mask == 0, base_height, 0)
+    if fill_holes:
+        galaxy_mask = ndimage.binary_fill_holes(data_mask)
+        base_layer[galaxy_mask * ~data_mask] = base_height
+
+    np.testing.assert_array_equal(model.data, data + base_layer)
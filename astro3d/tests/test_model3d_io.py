@@ -0,0 +1,35 @@
+"""Test reading model input files"""
+
+import numpy as np
+from astropy.io import fits
+
+from astro3d.core.model3d import Model3D
+
+
+def test_from_fits_scaled_int(tmp_path):
+    """Integer data with BZERO is read as the scaled (unsigned) values"""
+
+    data = np.arange(12, dtype=np.uint16).reshape(3, 4) * 5000
+    filename = str(tmp_path / 'uint16.fits')
+    fits.PrimaryHDU(data=data).writeto(filename)
+    assert 'BZERO' in fits.getheader(filename)
+
+    model = Model3D.from_fits(filename)
+    assert model.data_original.dtype == np.uint16
+    np.testing.assert_array_equal(model.data_original, data)
+
+
+def test_from_fits_bscale(tmp_path):
+    """Data with BSCALE/BZERO is read as the scaled float values"""
+
+    data = np.arange(12, dtype=np.int16).reshape(3, 4)
+    hdu = fits.PrimaryHDU(data=data)
+    hdu.header['BSCALE'] = 2
+    hdu.header['BZERO'] = 1
+    filename = str(tmp_path / 'bscale.fits')
+    hdu.writeto(filename, output_verify='silentfix')
+
+    model = Model3D.from_fits(filename)
+    np.testing.assert_array_equal(model.data_original, data * 2 + 1)
+    np.testing.assert_array_equal(model.data_original,
+                                  fits.getdata(filename))
@@ -0,0 +1,27 @@
+"""Test the region masks"""
+
+import numpy as np
+
+from astro3d.core.image_utils import resize_image
+from astro3d.core.region_mask import RegionMask
+
+
+def test_resize_cache():
+    """Resized masks are cached until the mask is reassigned"""
+
+    mask = np.zeros((40, 50), dtype=bool)
+    mask[10:20, 5:30] = True
+    region_mask = RegionMask(mask, 'spiral')
+
+    resized = region_mask.resize(0.5)
+    np.testing.assert_array_equal(resized, resize_image(mask, 0.5))
+    assert not resized.flags.writeable
+    assert region_mask.resize(0.5) is resized
+    assert region_mask.resize(1) is region_mask.mask
+
+    mask2 = np.zeros((40, 50), dtype=bool)
+    mask2[25:35, 30:45] = True
+    region_mask.mask = mask2
+    resized2 = region_mask.resize(0.5)
+    assert resized2 is not resized
+    np.testing.assert_array_equal(resized2, resize_image(mask2, 0.5))
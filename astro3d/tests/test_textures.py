@@ -0,0 +1,215 @@
+"""Test the textures"""
+
+from astropy.table import Table
+from astropy.utils.exceptions import AstropyUserWarning
+import numpy as np
+import pytest
+from scipy.ndimage import binary_dilation
+
+from astro3d.core.textures import (DotsTexture, HexagonalGrid, LinesTexture,
+                                   make_stellar_models, make_stellar_textures,
+                                   mask_texture_image)
+
+
+def make_lines():
+    return LinesTexture('linear', 5, 3., 20)
+
+
+def make_dots():
+    return DotsTexture('spherical', 9, 4., grid=HexagonalGrid(11))
+
+
+@pytest.mark.parametrize('make_texture', [make_lines, make_dots])
+def test_texture_cache(make_texture):
+    """The cached texture image is the same as a new one"""
+
+    shape = (100, 120)
+    texture = make_texture()
+    data = texture(shape)
+    assert texture.prepare(shape) is texture.prepare(shape)
+    np.testing.assert_array_equal(texture(shape), data)
+    np.testing.assert_array_equal(make_texture()(shape), data)
+
+    # a different shape rebuilds the texture image
+    data2 = texture((80, 90))
+    assert data2.shape == (80, 90)
+    np.testing.assert_array_equal(data2, make_texture()((80, 90)))
+
+
+@pytest.mark.parametrize('make_texture', [make_lines, make_dots])
+def test_texture_copy(make_texture):
+    """The unmasked texture image is a copy of the cached image"""
+
+    shape = (100, 120)
+    texture = make_texture()
+    data = texture(shape)
+    assert not np.shares_memory(data, texture.prepare(shape))
+    data[:] = -1.
+    assert texture(shape).min() == 0.
+
+
+@pytest.mark.parametrize('name, value', [('spacing', 7), ('thickness', 9),
+                                         ('height', 1.),
+                                         ('orientation', 30.),
+                                         ('profile', 'spherical')])
+def test_lines_texture_parameters(name, value):
+    """Changing a parameter rebuilds the lines texture image"""
+
+    shape = (100, 120)
+    texture = make_lines()
+    data = texture(shape)
+    setattr(texture, name, value)
+    data2 = texture(shape)
+
+    expected = make_lines()
+    setattr(expected, name, value)
+    assert not np.array_equal(data2, data)
+    np.testing.assert_array_equal(data2, expected._make_texture(shape))
+
+
+@pytest.mark.parametrize('name, value', [('height', 1.), ('diameter', 5),
+                                         ('profile', 'linear')])
+def test_dots_texture_parameters(name, value):
+    """Changing a parameter rebuilds the dots texture image"""
+
+    shape = (100, 120)
+    texture = make_dots()
+    data = texture(shape)
+    setattr(texture, name, value)
+    data2 = texture(shape)
+
+    expected = make_dots()
+    setattr(expected, name, value)
+    assert not np.array_equal(data2, data)
+    np.testing.assert_array_equal(data2, expected(shape))
+    if name == 'height':
+        assert data2.max() == 1.
+
+
+def test_dots_texture_locations():
+    """Changing the dot locations rebuilds the texture image"""
+
+    shape = (50, 60)
+    texture = DotsTexture('linear', 5, 2., locations=[(10, 10), (30, 20)])
+    data = texture(shape)
+    texture.locations = [(10, 10), (40, 20)]
+    data2 = texture(shape)
+    assert data2[20, 40] == 2.
+    assert data2[20, 30] == 0.
+    assert data[20, 30] == 2.
+
+
+@pytest.mark.parametrize('make_texture', [make_lines, make_dots])
+def test_texture_mask_out(make_texture):
+    """Masked textures are layered into ``out``"""
+
+    shape = (100, 120)
+    mask = np.zeros(shape, dtype=bool)
+    mask[20:60, 30:100] = True
+    texture = make_texture()
+    data = texture(shape)
+
+    out = np.full(shape, -1.)
+    result = texture(shape, mask=mask, out=out)
+    assert result is out
+    np.testing.assert_array_equal(out[mask], data[mask])
+    assert np.all(out[~mask] == -1.)
+    np.testing.assert_array_equal(texture(shape, mask=mask),
+                                  np.where(mask, data, 0.))
+    np.testing.assert_array_equal(mask_texture_image(data, mask),
+                                  np.where(mask, data, 0.))
+
+
+def full_image_stellar_textures(data, stellar_tables, exclusion_mask=None):
+    """
+    The original make_stellar_textures, which rendered each model into
+    full-size images.
+    """
+
+    stellar_models = []
+    for stellar_type, table in stellar_tables.items():
+        stellar_models.extend(make_stellar_models(stellar_type, table))
+
+    stellar_mask = np.zeros(data.shape)
+    for model in stellar_models:
+        model.render(stellar_mask)
+    stellar_mask = (stellar_mask != 0)
+
+    base_heights = []
+    good_models = []
+    for model in stellar_models:
+        model_mask = np.zeros(data.shape)
+        model.render(model_mask)
+        model_mask = (model_mask != 0)
+        if not np.any(model_mask):
+            continue
+        model_mask_xor = np.logical_xor(
+            binary_dilation(model_mask, np.ones((3, 3))), model_mask)
+        border_mask = np.logical_and(model_mask_xor, ~stellar_mask)
+        if np.any(border_mask):
+            base_heights.append(np.max(data[border_mask]))
+            good_models.append(model)
+
+    stellar_textures = np.zeros(data.shape)
+    base_heights_img = np.zeros(data.shape)
+    idx = np.argsort(base_heights)
+    for i in idx:
+        texture = np.zeros(data.shape)
+        good_models[i].render(texture)
+        mask = (texture != 0)
+        if exclusion_mask is not None:
+            if np.any(np.logical_and(mask, exclusion_mask)):
+                continue
+        stellar_textures[mask] = texture[mask]
+        base_heights_img[mask] = base_heights[i]
+
+    return stellar_textures, base_heights_img
+
+
+@pytest.mark.parametrize('exclude', [False, True])
+def test_make_stellar_textures(exclude):
+    """The windowed rendering matches rendering full-size images"""
+
+    rng = np.random.default_rng(0)
+    shape = (120, 150)
+    data = rng.random(shape)
+    # include overlapping textures and textures at the image edges
+    stars = Table({'xcentroid': [20., 24., 75.3, 0.5, 149.],
+                   'ycentroid': [30., 33., 60.7, 50., 119.],
+                   'flux': [10., 5., 7., 3., 8.]})
+    clusters = Table({'xcentroid': [110., 140.], 'ycentroid': [20., 2.],
+                      'flux': [4., 6.]})
+    stellar_tables = {'stars': stars, 'star_clusters': clusters}
+
+    exclusion_mask = None
+    if exclude:
+        exclusion_mask = np.zeros(shape, dtype=bool)
+        exclusion_mask[55:65, 70:80] = True
+
+    result = make_stellar_textures(data, stellar_tables,
+                                   exclusion_mask=exclusion_mask)
+    expected = full_image_stellar_textures(data, stellar_tables,
+                                           exclusion_mask=exclusion_mask)
+    assert np.any(result[0])
+    np.testing.assert_array_equal(result[0], expected[0])
+    np.testing.assert_array_equal(result[1], expected[1])
+
+
+def test_make_stellar_textures_outside():
+    """Stars just outside of the image are skipped with a warning"""
+
+    data = np.random.default_rng(0).random((60, 80))
+    # the padded window of the first star overlaps the image, but its
+    # bounding box does not (model.render on the image raises)
+    stars = Table({'xcentroid': [-19.5, 40.], 'ycentroid': [30., 30.],
+                   'flux': [5., 5.]})
+    model = make_stellar_models('stars', stars)[0]
+    with pytest.raises(ValueError):
+        model.render(np.zeros(data.shape))
+
+    with pytest.warns(AstropyUserWarning, match='does not overlap'):
+        result = make_stellar_textures(data, {'stars': stars})
+    expected = full_image_stellar_textures(data, {'stars': stars[1:]})
+    assert np.any(result[0])
+    np.testing.assert_array_equal(result[0], expected[0])
+    np.testing.assert_array_equal(result[1], expected[1])